@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 #
 # Decoder for Texecom Connect API/Protocol
 #
@@ -16,8 +16,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from __future__ import print_function
-
 import os
 import sys
 import json
@@ -106,8 +104,8 @@ def message_handler(payload):
     tc.log(tc.decode_message_to_text(payload))
     msg_type, payload = payload[0], payload[1:]
     if msg_type == tc.MSG_ZONEEVENT:
-        zone_number = ord(payload[0])
-        zone_bitmap = ord(payload[1])
+        zone_number = payload[0]
+        zone_bitmap = payload[1]
         zone = tc.get_zone(zone_number)
         zone.state = zone_bitmap & 0x3
         topic = "homeassistant/binary_sensor/"+str.lower((zone.text).replace(" ", "_"))+"/state"
@@ -118,8 +116,8 @@ def message_handler(payload):
         tc.log("MQTT Update %s: %s" % (topic, zone.state))
         client.publish(topic,zone.state)
     elif msg_type == tc.MSG_AREAEVENT:
-        area_number = ord(payload[0])
-        area_state = ord(payload[1])
+        area_number = payload[0]
+        area_state = payload[1]
         area_state_str = ["disarmed", "pending", "pending", "armed_away", "armed_night", "triggered"][area_state]
         area = tc.get_area(area_number)
         area.state = area_state_str
@@ -128,24 +126,6 @@ def message_handler(payload):
         client.publish(topic, area.state)
 
 
-# disable buffering to stdout when it's redirected to a file/pipe
-# This makes sure any events appear immediately in the file/pipe,
-# instead of being queued until there is a full buffer's worth.
-class Unbuffered(object):
-    def __init__(self, stream):
-        self.stream = stream
-
-    def write(self, data):
-        self.stream.write(data)
-        self.stream.flush()
-
-    def writelines(self, datas):
-        self.stream.writelines(datas)
-        self.stream.flush()
-
-    def __getattr__(self, attr):
-        return getattr(self.stream, attr)
-
 if __name__ == '__main__':
     texhost = os.getenv('TEXHOST','192.168.1.9')
     texport = os.getenv('TEXPORT',10001)
@@ -154,6 +134,9 @@ if __name__ == '__main__':
     # random 16 character alphanumeric string.
     udlpassword = os.getenv('UDLPASSWORD','1234')
 
-    sys.stdout = Unbuffered(sys.stdout)
+    # flush stdout at the end of every line even when it's redirected to a
+    # file/pipe. This makes sure any events appear immediately in the
+    # file/pipe, instead of being queued until there is a full buffer's worth.
+    sys.stdout.reconfigure(line_buffering=True)
     tc = TexecomConnectMqtt(texhost, texport, udlpassword, message_handler)
     tc.event_loop()
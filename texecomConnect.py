@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 #
 # Decoder for Texecom Connect API/Protocol
 #
@@ -16,19 +16,46 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from __future__ import absolute_import
-from __future__ import division
-from __future__ import print_function
-
 import socket
 import time
 import datetime
 import os
 import sys
-import re
-
-import crcmod
-import hexdump
+import struct
+import selectors
+import subprocess
+
+
+def _make_crc8_table(poly):
+    """Build the 256 entry lookup table for a non-reflected CRC8"""
+    table = bytearray(256)
+    for byte in range(256):
+        crc = byte
+        for bit in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ poly) & 0xff
+            else:
+                crc = (crc << 1) & 0xff
+        table[byte] = crc
+    return table
+
+
+def _zone_bitmap_text(zone_bitmap):
+    """Describe the state and flags in a zone event bitmap"""
+    zone_str = ["secure", "active", "tamper", "short"][zone_bitmap & 0x3]
+    if zone_bitmap & (1 << 2):
+        zone_str += ", fault"
+    if zone_bitmap & (1 << 3):
+        zone_str += ", failed test"
+    if zone_bitmap & (1 << 4):
+        zone_str += ", alarmed"
+    if zone_bitmap & (1 << 5):
+        zone_str += ", manual bypassed"
+    if zone_bitmap & (1 << 6):
+        zone_str += ", auto bypassed"
+    if zone_bitmap & (1 << 7):
+        zone_str += ", zone masked"
+    return zone_str
 
 class User(object):
     def __init__(self):
@@ -111,21 +138,27 @@ class Zone(object):
 
 class TexecomConnect(object):
     LENGTH_HEADER = 4
-    HEADER_START = 't'
-    HEADER_TYPE_COMMAND = 'C'
-    HEADER_TYPE_RESPONSE = 'R'
-    HEADER_TYPE_MESSAGE = 'M'  # unsolicited message
-
-    CMD_LOGIN = chr(1)
-    CMD_GETZONEDETAILS = chr(3)
-    CMD_GETLCDDISPLAY = chr(13)
-    CMD_GETLOGPOINTER = chr(15)
-    CMD_GETPANELIDENTIFICATION = chr(22)
-    CMD_GETDATETIME = chr(23)
-    CMD_GETSYSTEMPOWER = chr(25)
-    CMD_GETUSER = chr(27)
-    CMD_GETAREADETAILS = chr(35)
-    CMD_SETEVENTMESSAGES = chr(37)
+    # the length field in the header is one byte
+    MAX_FRAME_LENGTH = 255
+    HEADER_START = b't'
+    HEADER_TYPE_COMMAND = b'C'
+    HEADER_TYPE_RESPONSE = b'R'
+    HEADER_TYPE_MESSAGE = b'M'  # unsolicited message
+    # start, type, length, sequence
+    HEADER_STRUCT = struct.Struct('>ccBB')
+    # one byte bytes objects indexed by value, for appending the CRC to a frame
+    SINGLE_BYTES = tuple(bytes((b,)) for b in range(256))
+
+    CMD_LOGIN = b'\x01'
+    CMD_GETZONEDETAILS = b'\x03'
+    CMD_GETLCDDISPLAY = b'\x0d'
+    CMD_GETLOGPOINTER = b'\x0f'
+    CMD_GETPANELIDENTIFICATION = b'\x16'
+    CMD_GETDATETIME = b'\x17'
+    CMD_GETSYSTEMPOWER = b'\x19'
+    CMD_GETUSER = b'\x1b'
+    CMD_GETAREADETAILS = b'\x23'
+    CMD_SETEVENTMESSAGES = b'\x25'
 
     # 2-3 seconds is mentioned in section 5.5 of protocol specification
     # Increasing this value is not recommended as it will mean if the
@@ -134,18 +167,46 @@ class TexecomConnect(object):
     # longer for us to realise and resend the command
     CMD_TIMEOUT = 2
     CMD_RETRIES = 3
+    # the panel drops the connection after 60 seconds without a command, so
+    # send one after this many seconds of idling
+    IDLE_COMMAND_INTERVAL = 30
 
     ZONETYPE_UNUSED = 0
 
-    CMD_RESPONSE_ACK = '\x06'
-    CMD_RESPONSE_NAK = '\x15'
-
-    MSG_DEBUG = chr(0)
-    MSG_ZONEEVENT = chr(1)
-    MSG_AREAEVENT = chr(2)
-    MSG_OUTPUTEVENT = chr(3)
-    MSG_USEREVENT = chr(4)
-    MSG_LOGEVENT = chr(5)
+    # CRC8 used by the panel: poly 0x185 (x^8 + x^7 + x^2 + 1), not reflected,
+    # initial value 0xff
+    CRC8_TABLE = _make_crc8_table(0x85)
+
+    # bytes.translate table mapping everything except ASCII letters, digits
+    # and '_' (ie. the \W regex class) to a space
+    TEXT_TRANSLATE_TABLE = bytes(c if (c < 0x80 and chr(c).isalnum()) or c == 0x5f else 0x20 for c in range(256))
+
+    CMD_RESPONSE_ACK = b'\x06'
+    CMD_RESPONSE_NAK = b'\x15'
+
+    # message types are compared against the first byte of the payload,
+    # which is an int when indexing bytes
+    MSG_DEBUG = 0
+    MSG_ZONEEVENT = 1
+    MSG_AREAEVENT = 2
+    MSG_OUTPUTEVENT = 3
+    MSG_USEREVENT = 4
+    MSG_LOGEVENT = 5
+
+    # text for every possible zone event bitmap, so decoding is a single lookup
+    ZONE_BITMAP_TEXT = tuple(_zone_bitmap_text(bitmap) for bitmap in range(256))
+    AREA_STATES = ("disarmed", "in exit", "in entry", "armed", "part armed", "in alarm")
+    USER_STATES = ("code", "tag", "code+tag")
+    OUTPUT_LOCATIONS = ("Panel outputs",
+                        "Digi outputs",
+                        "Digi Channel low 8",
+                        "Digi Channel high 8",
+                        "Redcare outputs",
+                        "Custom outputs 1",
+                        "Custom outputs 2",
+                        "Custom outputs 3",
+                        "Custom outputs 4",
+                        "X-10 outputs")
 
     zone_types = {}
     zone_types[1] = "Entry/Exit 1"
@@ -336,7 +397,6 @@ class TexecomConnect(object):
         self.host = host
         self.port = port
         self.udlpassword = udl_password
-        self.crc8_func = crcmod.mkCrcFun(poly=0x185, rev=False, initCrc=0xff)
         self.nextseq = 0
         self.message_handler_func = message_handler_func
         self.print_network_traffic = False
@@ -351,33 +411,97 @@ class TexecomConnect(object):
         self.user = {}
         self.area = {}
         self.s = None
+        # used by event_loop to wait for data from the panel
+        self.selector = None
+        # received data is read into this buffer; frames are parsed from
+        # _rxhead onwards, and _rxlen is where the next read will be stored
+        self._rxbuf = bytearray(8192)
+        self._rxview = memoryview(self._rxbuf)
+        self._rxhead = 0
+        self._rxlen = 0
         # used to record which of our idle commands we last sent to the panel
         self.lastIdleCommand = 0
         # Set to true if the idle loop should reread the site data
         self.siteDataChanged = False
+        # decoders for unsolicited messages, keyed by message type
+        self.message_decoders = {
+            self.MSG_DEBUG: self.decode_debug_message,
+            self.MSG_ZONEEVENT: self.decode_zone_event,
+            self.MSG_AREAEVENT: self.decode_area_event,
+            self.MSG_OUTPUTEVENT: self.decode_output_event,
+            self.MSG_USEREVENT: self.decode_user_event,
+            self.MSG_LOGEVENT: self.decode_log_event,
+        }
 
     @staticmethod
     def hexstr(s):
         """Convert a binary string into a hex representation suitable for logging payloads etc"""
-        return " ".join("{:02x}".format(ord(c)) for c in s)
+        return s.hex(' ')
+
+    @classmethod
+    def clean_text(cls, text):
+        """Convert a NUL padded name from the panel into a string, with each
+        run of non-word characters replaced by a single space"""
+        return b' '.join(text.translate(cls.TEXT_TRANSLATE_TABLE).split()).decode('ascii')
+
+    def hexdump(self, data):
+        """Log binary data as hex, 16 bytes per line"""
+        for offset in range(0, len(data), 16):
+            self.log("{:04x}: {}".format(offset, self.hexstr(data[offset:offset + 16])))
+
+    @staticmethod
+    def _crc8(data, tbl=CRC8_TABLE):
+        """Calculate the CRC8 of a message, one table lookup per byte"""
+        # Slicing-by-8 (eight tables, eight bytes per iteration) was tried but is
+        # slower than this in CPython for every frame size the panel sends, as
+        # the extra lookups and XORs cost more than the loop iterations saved.
+        crc = 0xff
+        for b in data:
+            crc = tbl[crc ^ b]
+        return crc
+
+    @property
+    def print_network_traffic(self):
+        return self.__print_network_traffic
+
+    @print_network_traffic.setter
+    def print_network_traffic(self, print_network_traffic):
+        # rather than checking the flag for every frame, swap in versions of
+        # the send/receive methods that dump the traffic
+        self.__print_network_traffic = print_network_traffic
+        if print_network_traffic:
+            self._fill = self._fill_and_dump
+            self.sendcommandbody = self._sendcommandbody_and_dump
+        else:
+            self.__dict__.pop('_fill', None)
+            self.__dict__.pop('sendcommandbody', None)
 
     def connect(self):
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # commands are tiny, so don't let Nagle's algorithm hold them back
+        # waiting for an ACK
+        self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # room for a burst of event messages between reads
+        self.s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
         self.s.settimeout(self.CMD_TIMEOUT)
         self.s.connect((self.host, self.port))
+        self._rxhead = self._rxlen = 0
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.s, selectors.EVENT_READ)
         # if we send the login message to fast the panel ignores it; texecom
         # recommend 500ms, see:
         # http://texecom.websitetoolbox.com/post/show_single_post?pid=1303528828&postcount=4&forum=627911
         time.sleep(0.5)
 
     def getnextseq(self):
-        if self.nextseq == 256:
-            self.nextseq = 0
         nextseq = self.nextseq
-        self.nextseq += 1
+        self.nextseq = (nextseq + 1) & 0xff
         return nextseq
 
     def closesocket(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
         if self.s is not None:
             try:
                 self.s.shutdown(socket.SHUT_RDWR)
@@ -386,121 +510,159 @@ class TexecomConnect(object):
             self.s.close()
             self.s = None
 
-    def recvresponse(self):
+    def recvresponse(self, block=True):
         """Receive a response to a command. Automatically handles any
-        messages that arrive first"""
+        messages that arrive first. If block is False, only the frames
+        that have already been received are handled, responses are ignored,
+        and None is returned once there are no complete frames left"""
         startTime = time.time()
         while True:
-            if time.time() - startTime > self.CMD_TIMEOUT:
+            if block and time.time() - startTime > self.CMD_TIMEOUT:
                 # if we have had multiple event messages, we may get to the timeout time without the recv timing out
                 raise socket.timeout
-            assert self.last_command_time > 0
-            time_since_last_command = time.time() - self.last_command_time
-            if time_since_last_command > 30:
-                # send any message to reset the panel's 60 second timeout
-                # this ends up recursively calling recvresponse; however as our retry * timeout (3 * 2 == 6) is
-                # far less than the 30 seconds between idle commands that won't be an issue
-                if self.lastIdleCommand == 0:
-                    result = self.get_date_time()
-                elif self.lastIdleCommand == 1:
-                    result = self.get_log_pointer()
-                else:
-                    result = self.get_system_power()
-                self.lastIdleCommand += 1
-                if self.lastIdleCommand == 3:
-                    self.lastIdleCommand = 0
-                if result is None:
-                    self.log("idle command failed; closing socket")
-                    self.closesocket()
-                    return None
-            header = self.s.recv(self.LENGTH_HEADER)
-            if self.print_network_traffic:
-                self.log("Received message header:")
-                hexdump.hexdump(header)
-            if header == "+++":
-                self.log("Panel has forcibly dropped connection, possibly due to inactivity")
-                self.closesocket()
-                return None
-            if header == "+++A":
-                self.log("Panel is trying to hangup modem; probably connected too soon")
-                self.closesocket()
+            frame = self._read_frame() if block else self._parse_frame()
+            if frame is None:
                 return None
-            if len(header) == 0:
-                self.log("Panel has closed connection")
-                self.closesocket()
-                return None
-            if len(header) < self.LENGTH_HEADER:
-                self.log("Header received from panel is too short, only {:d} bytes, ignoring - contents {}".format(
-                    len(header), self.hexstr(header)))
-                hexdump.hexdump(header)
+            msg_type, msg_sequence, frame = frame
+            # running the CRC over the message including its CRC byte gives 0 if the CRC is correct
+            if self._crc8(frame) != 0:
+                # skip just this frame; if it was our response we'll time out and resend the command
+                self.log("crc: expected=" + str(self._crc8(frame[:-1])) + " actual=" + str(frame[-1]))
                 continue
-            msg_start, msg_type, msg_length, msg_sequence = list(header)
-            if msg_start != 't':
-                self.log("unexpected msg start: " + hex(ord(msg_start)))
-                hexdump.hexdump(header)
-                return None
-            expected_len = ord(msg_length) - self.LENGTH_HEADER
-            payload = self.s.recv(expected_len)
-            if self.print_network_traffic:
-                self.log("Received message payload:")
-                hexdump.hexdump(payload)
-            if len(payload) < expected_len:
-                self.log(
-                    "Ignoring message, payload shorter than expected - got {:d} bytes, expected {:d} - contents {}".format(
-                        len(payload), expected_len, self.hexstr(payload)))
-                print("header:")
-                hexdump.hexdump(header)
-                print("payload:")
-                hexdump.hexdump(payload)
-                continue
-            payload, msg_crc = payload[:-1], ord(payload[-1])
-            expected_crc = self.crc8_func(header + payload)
-            if msg_crc != expected_crc:
-                self.log("crc: expected=" + str(expected_crc) + " actual=" + str(msg_crc))
-                return None
+            payload = frame[self.LENGTH_HEADER:-1]
             if msg_type == self.HEADER_TYPE_RESPONSE:
                 if msg_sequence != self.last_sequence:
                     self.log(
-                        "incorrect response seq: expected=" + str(self.last_sequence) + " actual=" + str(ord(msg_sequence)))
+                        "incorrect response seq: expected=" + str(self.last_sequence) + " actual=" + str(msg_sequence))
                     # recv again - either we receive the correct reply in the next packet, or we'll time out and retry the command
                     continue
             elif msg_type == self.HEADER_TYPE_MESSAGE:
                 if self.last_received_seq != -1:
-                    next_msg_seq = self.last_received_seq + 1
-                    if next_msg_seq == 256:
-                        next_msg_seq = 0
-                    if msg_sequence == chr(self.last_received_seq):
+                    next_msg_seq = (self.last_received_seq + 1) & 0xff
+                    if msg_sequence == self.last_received_seq:
                         self.log("ignoring message, sequence number is the same as last message: expected=" + str(
-                            next_msg_seq) + " actual=" + str(ord(msg_sequence)))
+                            next_msg_seq) + " actual=" + str(msg_sequence))
                         continue
-                    if msg_sequence != chr(next_msg_seq):
+                    if msg_sequence != next_msg_seq:
                         self.log("message seq incorrect - processing message anyway: expected=" + str(
-                            next_msg_seq) + " actual=" + str(ord(msg_sequence)))
+                            next_msg_seq) + " actual=" + str(msg_sequence))
                         # process message anyway; perhaps we missed one or they arrived out of order
-                self.last_received_seq = ord(msg_sequence)
+                self.last_received_seq = msg_sequence
             if msg_type == self.HEADER_TYPE_COMMAND:
                 self.log("received command unexpectedly")
+                if not block:
+                    # keep going so the frames behind this one are handled now
+                    continue
                 return None
             elif msg_type == self.HEADER_TYPE_RESPONSE:
+                if not block:
+                    # no command is waiting for this, eg. a late reply to a command we resent
+                    self.log("ignoring response received outside of a command")
+                    continue
                 return payload
             elif msg_type == self.HEADER_TYPE_MESSAGE:
                 # FIXME: for "Site Data Changed" we should re-read the zone names etc - need to decode message
                 # self.siteDataChanged = True
                 self.message_handler_func(payload)
 
+    def _fill(self):
+        """Read whatever the panel has sent so far into the receive buffer,
+        using a single recv. Returns the number of bytes read"""
+        if self._rxhead == self._rxlen:
+            self._rxhead = self._rxlen = 0
+        elif len(self._rxbuf) - self._rxlen < self.MAX_FRAME_LENGTH:
+            # move the trailing partial frame to the start of the buffer; copying
+            # between memoryviews of the same buffer copes with the overlap
+            remaining = self._rxlen - self._rxhead
+            self._rxview[:remaining] = self._rxview[self._rxhead:self._rxlen]
+            self._rxhead, self._rxlen = 0, remaining
+        n = self.s.recv_into(self._rxview[self._rxlen:])
+        self._rxlen += n
+        return n
+
+    def _fill_and_dump(self):
+        """_fill, logging the data received; used when print_network_traffic is set"""
+        n = type(self)._fill(self)
+        if n:
+            self.log("Received data:")
+            self.hexdump(self._rxview[self._rxlen - n:self._rxlen])
+        return n
+
+    def _parse_frame(self):
+        """Take the next complete frame out of the receive buffer, as a
+        (msg_type, msg_sequence, frame) tuple, without reading from the panel.
+        Returns None if there is no complete frame yet, or if the panel has
+        hung up, in which case the socket is closed"""
+        buf, head, tail = self._rxbuf, self._rxhead, self._rxlen
+        available = tail - head
+        # only look for the panel's hangup strings if this isn't the start of a frame
+        if available and buf[head] == 0x2b:  # '+'
+            if buf.startswith(b"+++A", head, tail):
+                self.log("Panel is trying to hangup modem; probably connected too soon")
+                self.closesocket()
+                return None
+            if buf.startswith(b"+++", head, tail):
+                self.log("Panel has forcibly dropped connection, possibly due to inactivity")
+                self.closesocket()
+                return None
+        if available < self.LENGTH_HEADER:
+            return None
+        msg_start, msg_type, msg_length, msg_sequence = self.HEADER_STRUCT.unpack_from(buf, head)
+        if msg_start != self.HEADER_START or msg_length <= self.LENGTH_HEADER:
+            self.log("unexpected msg header: " + self.hexstr(self._rxview[head:head + self.LENGTH_HEADER]))
+            # we can't tell where the next frame starts, so discard everything received so far
+            self._rxhead = self._rxlen = 0
+            return None
+        if available < msg_length:
+            return None
+        self._rxhead = head + msg_length
+        return msg_type, msg_sequence, self._rxview[head:self._rxhead].tobytes()
+
+    def _read_frame(self):
+        """Return the next complete frame as a (msg_type, msg_sequence, frame)
+        tuple, reading from the panel as needed. Returns None if the
+        connection has been closed"""
+        while True:
+            frame = self._parse_frame()
+            if frame is not None or self.s is None:
+                return frame
+            if self._fill() == 0:
+                self.log("Panel has closed connection")
+                self.closesocket()
+                return None
+
+    def send_idle_command(self):
+        """Send a command to reset the panel's 60 second timeout, cycling
+        through a few harmless ones. Closes the socket if the command fails"""
+        if self.lastIdleCommand == 0:
+            result = self.get_date_time()
+        elif self.lastIdleCommand == 1:
+            result = self.get_log_pointer()
+        else:
+            result = self.get_system_power()
+        self.lastIdleCommand += 1
+        if self.lastIdleCommand == 3:
+            self.lastIdleCommand = 0
+        if result is None:
+            self.log("idle command failed; closing socket")
+            self.closesocket()
+
     def sendcommandbody(self, body):
-        self.last_sequence = chr(self.getnextseq())
-        data = self.HEADER_START + self.HEADER_TYPE_COMMAND + \
-               chr(len(body) + 5) + self.last_sequence + body
-        data += chr(self.crc8_func(data))
-        if self.print_network_traffic:
-            self.log("Sending command:")
-            hexdump.hexdump(data)
+        self.last_sequence = self.getnextseq()
+        data = self.HEADER_STRUCT.pack(self.HEADER_START, self.HEADER_TYPE_COMMAND,
+                                       len(body) + 5, self.last_sequence) + body
+        data += self.SINGLE_BYTES[self._crc8(data)]
         self.s.send(data)
         self.last_command = data
 
+    def _sendcommandbody_and_dump(self, body):
+        """sendcommandbody, logging the command sent; used when print_network_traffic is set"""
+        type(self).sendcommandbody(self, body)
+        self.log("Sent command:")
+        self.hexdump(self.last_command)
+
     def login(self):
-        response = self.sendcommand(self.CMD_LOGIN, self.udlpassword)
+        response = self.sendcommand(self.CMD_LOGIN, self.udlpassword.encode('ascii'))
         if response is None:
             self.log("sendcommand returned None for login")
             return False
@@ -508,7 +670,7 @@ class TexecomConnect(object):
             self.log("NAK response from panel")
             return False
         elif response != self.CMD_RESPONSE_ACK:
-            self.log("unexpected ack payload: " + hex(ord(response)))
+            self.log("unexpected ack payload: " + self.hexstr(response))
             return False
         return True
 
@@ -520,20 +682,27 @@ class TexecomConnect(object):
         USER_EVENT_FLAG = 1 << 4
         LOG_FLAG = 1 << 5
         events = ZONE_EVENT_FLAG | AREA_EVENT_FLAG | OUTPUT_EVENT_FLAG | USER_EVENT_FLAG | LOG_FLAG
-        body = chr(events & 0xff) + chr(events >> 8)
+        body = struct.pack('<H', events)
         response = self.sendcommand(self.CMD_SETEVENTMESSAGES, body)
         if response == self.CMD_RESPONSE_NAK:
             self.log("NAK response from panel")
             return False
         elif response != self.CMD_RESPONSE_ACK:
-            self.log("unexpected ack payload: " + hex(ord(response)))
+            self.log("unexpected ack payload: " + self.hexstr(response))
             return False
         return True
 
-    @staticmethod
-    def log(string):
-        timestamp = time.strftime("%Y-%m-%d %X")
-        print(timestamp + ": " + string)
+    # (time in whole seconds, formatted timestamp) of the last log line
+    _log_timestamp = (0, "")
+
+    @classmethod
+    def log(cls, string):
+        now = int(time.time())
+        second, timestamp = cls._log_timestamp
+        if second != now:
+            timestamp = time.strftime("%Y-%m-%d %X", time.localtime(now))
+            cls._log_timestamp = (now, timestamp)
+        sys.stdout.write(timestamp + ": " + string + "\n")
 
     def sendcommand(self, cmd, body):
         if body is not None:
@@ -559,12 +728,12 @@ class TexecomConnect(object):
         if response is None:
             return None
 
-        commandid, payload = response[0], response[1:]
+        commandid, payload = response[:1], response[1:]
         if commandid != cmd:
-            if commandid == self.CMD_LOGIN and payload[0] == self.CMD_RESPONSE_NAK:
+            if commandid == self.CMD_LOGIN and payload[:1] == self.CMD_RESPONSE_NAK:
                 self.log("Received 'Log on NAK' from panel - session has timed out and needs to be restarted")
                 return None
-            self.log("Got response for wrong command id: Expected " + hex(ord(cmd)) + ", got " + hex(ord(commandid)))
+            self.log("Got response for wrong command id: Expected " + hex(cmd[0]) + ", got " + hex(commandid[0]))
             self.log("Payload: " + self.hexstr(payload))
             return None
         return payload
@@ -577,7 +746,6 @@ class TexecomConnect(object):
             self.log("GETDATETIME: response too short")
             self.log("Payload: " + self.hexstr(datetimeresp))
             return None
-        datetimeresp = bytearray(datetimeresp)
         datetimestr = '20{2:02d}-{1:02d}-{0:02d} {3:02d}:{4:02d}:{5:02d}'.format(*datetimeresp)
         paneltime = datetime.datetime(2000 + datetimeresp[2], datetimeresp[1], datetimeresp[0], *datetimeresp[3:])
         seconds = int((paneltime - datetime.datetime.now()).total_seconds())
@@ -596,6 +764,7 @@ class TexecomConnect(object):
             self.log("GETLCDDISPLAY: response wrong length")
             self.log("Payload: " + self.hexstr(lcddisplay))
             return None
+        lcddisplay = lcddisplay.decode('ascii', 'replace')
         self.log("Panel LCD display: " + lcddisplay)
         return lcddisplay
 
@@ -607,7 +776,7 @@ class TexecomConnect(object):
             self.log("GETLOGPOINTER: response wrong length")
             self.log("Payload: " + self.hexstr(logpointerresp))
             return None
-        logpointer = ord(logpointerresp[0]) + (ord(logpointerresp[1]) << 8)
+        logpointer, = struct.unpack('<H', logpointerresp)
         self.log("Log pointer: {:d}".format(logpointer))
         return logpointer
 
@@ -626,43 +795,37 @@ class TexecomConnect(object):
             self.log("GETPANELIDENTIFICATION: response wrong length")
             self.log("Payload: " + self.hexstr(panelid))
             return None
+        panelid = panelid.decode('ascii', 'replace')
         self.log("Panel identification: " + panelid)
         return panelid
 
     def get_zone(self, zone_number):
-        if zone_number not in self.zone:
-            self.zone[zone_number] = Zone(zone_number)
-        return self.zone[zone_number]
+        zone = self.zone.get(zone_number)
+        if zone is None:
+            zone = self.zone[zone_number] = Zone(zone_number)
+        return zone
 
     def get_zone_details(self, zone_number):
         # zone is two bytes on 680
-        details = self.sendcommand(self.CMD_GETZONEDETAILS, chr(zone_number))
+        details = self.sendcommand(self.CMD_GETZONEDETAILS, struct.pack('B', zone_number))
         if details is None:
             return None
         zone = self.get_zone(zone_number)
         if len(details) == 34:
-            zone.zoneType = ord(details[0])
-            zone.areaBitmap = ord(details[1])
-            zone.text = details[2:]
+            zone.zoneType, zone.areaBitmap = struct.unpack_from('<BB', details)
+            zonetext = details[2:]
         elif len(details) == 35:
-            zone.zoneType = ord(details[0])
-            zone.areaBitmap = ord(details[1]) + (ord(details[2]) << 8)
-            zone.text = details[3:]
+            zone.zoneType, zone.areaBitmap = struct.unpack_from('<BH', details)
+            zonetext = details[3:]
         elif len(details) == 41:
-            zone.zoneType = ord(details[0])
-            zone.areaBitmap = ord(details[1]) + (ord(details[2]) << 8) + (ord(details[3]) << 16) + (
-                        ord(details[4]) << 24) + \
-                              (ord(details[5]) << 32) + (ord(details[6]) << 40) + (ord(details[7]) << 48) + (
-                                          ord(details[8]) << 56)
-            zone.text = details[9:]
+            zone.zoneType, zone.areaBitmap = struct.unpack_from('<BQ', details)
+            zonetext = details[9:]
         else:
             self.log("GETZONEDETAILS: response wrong length")
             self.log("Payload: " + self.hexstr(details))
             return None
 
-        zone.text = zone.text.replace("\x00", " ")
-        zone.text = re.sub(r'\W+', ' ', zone.text)
-        zone.text = zone.text.strip()
+        zone.text = self.clean_text(zonetext)
         if zone.zoneType != self.ZONETYPE_UNUSED:
             self.log("zone {:d} type {} name '{}'".
                      format(zone.number, self.zone_types[zone.zoneType], zone.text))
@@ -674,21 +837,15 @@ class TexecomConnect(object):
         return self.area[areaNumber]
 
     def get_area_details(self, areaNumber):
-        details = self.sendcommand(self.CMD_GETAREADETAILS, chr(areaNumber))
+        details = self.sendcommand(self.CMD_GETAREADETAILS, struct.pack('B', areaNumber))
         if details is None:
             return None
         area = Area()
         if len(details) == 25:
             # first byte is area number
-            areatext = details[1:17]
-            areatext = areatext.replace("\x00", " ")
-            areatext = re.sub(r'\W+', ' ', areatext)
-            areatext = areatext.strip()
-            area.name = areatext
-            area.exitDelay = ord(details[17]) + (ord(details[18]) << 8)
-            area.entry1Delay = ord(details[19]) + (ord(details[20]) << 8)
-            area.entry2Delay = ord(details[21]) + (ord(details[22]) << 8)
-            area.secondEntry = ord(details[23]) + (ord(details[24]) << 8)
+            area.name = self.clean_text(details[1:17])
+            area.exitDelay, area.entry1Delay, area.entry2Delay, area.secondEntry = \
+                struct.unpack_from('<HHHH', details, 17)
         else:
             self.log("GETAREADETAILS: response wrong length")
             self.log("Payload: " + self.hexstr(details))
@@ -701,32 +858,28 @@ class TexecomConnect(object):
     def bcdDecode(bcd):
         result = ""
         for char in bcd:
-            for val in (ord(char) >> 4, ord(char) & 0xF):
+            for val in (char >> 4, char & 0xF):
                 if val <= 9:
                     result += str(val)
         return result
 
     def get_user(self, usernumber):
         # panel may support more than 255 users, in which case this needs 2 bytes
-        # body = chr(usernumber & 0xff)+chr(usernumber >> 8)
-        body = chr(usernumber)
+        # body = struct.pack('<H', usernumber)
+        body = struct.pack('B', usernumber)
         details = self.sendcommand(self.CMD_GETUSER, body)
         if details is None:
             return None
         user = User()
         if len(details) == 23:
-            username = details[0:8]
-            username = username.replace("\x00", " ")
-            username = re.sub(r'\W+', ' ', username)
-            username = username.strip()
-            user.name = username
+            user.name = self.clean_text(details[0:8])
             user.passcode = self.bcdDecode(details[8:11])
-            user.areas = ord(details[11])
+            user.areas = details[11]
             user.modifiers = details[12]
             user.locks = details[13]
             user.doors = details[14:17]
             user.tag = self.bcdDecode(details[17:21])  # last byte always 0xff
-            user.config = ord(details[21]) + (ord(details[22]) << 8)
+            user.config, = struct.unpack_from('<H', details, 21)
         else:
             # there are other lengths but I have no way to test
             self.log("GETUSER: unexpected response length {:d}".format(len(details)))
@@ -746,11 +899,7 @@ class TexecomConnect(object):
             self.log("GETSYSTEMPOWER: response wrong length")
             self.log("Payload: " + self.hexstr(details))
             return None
-        ref_v = ord(details[0])
-        sys_v = ord(details[1])
-        bat_v = ord(details[2])
-        sys_i = ord(details[3])
-        bat_i = ord(details[4])
+        ref_v, sys_v, bat_v, sys_i, bat_i = details
 
         system_voltage = 13.7 + ((sys_v - ref_v) * 0.070)
         battery_voltage = 13.7 + ((bat_v - ref_v) * 0.070)
@@ -763,6 +912,10 @@ class TexecomConnect(object):
         return (system_voltage, battery_voltage, system_current, battery_current)
 
     def get_all_zones(self):
+        # One command at a time: nothing says the panel accepts a second
+        # command before it has answered the first, it already sometimes drops
+        # commands that coincide with an event, and sendcommand can only
+        # resend the single outstanding command on a timeout.
         for zoneNumber in range(1, self.numberOfZones + 1):
             zone = self.get_zone_details(zoneNumber)
             self.zone[zoneNumber] = zone
@@ -788,6 +941,14 @@ class TexecomConnect(object):
         self.get_all_zones()
         self.get_all_users()
 
+    def send_message(self, message):
+        """Run send-message.sh in the background, so the event loop isn't held up
+        waiting for it"""
+        try:
+            subprocess.Popen(["./send-message.sh", message])
+        except OSError as e:
+            self.log("Running send-message.sh failed - {}".format(e))
+
     def event_loop(self):
         lastConnectedAt = time.time()
         notifiedConnectionLoss = False
@@ -801,7 +962,7 @@ class TexecomConnect(object):
             connectionLostTime = time.time() - lastConnectedAt
             if connectionLostTime >= 60 and not notifiedConnectionLoss:
                 self.log("Connection lost for over 60 seconds - calling send-message.sh")
-                os.system("./send-message.sh 'connection lost'")
+                self.send_message("connection lost")
                 notifiedConnectionLoss = True
             try:
                 self.connect()
@@ -823,7 +984,7 @@ class TexecomConnect(object):
             connected = True
             if notifiedConnectionLoss:
                 self.log("Connection regained - calling send-message.sh")
-                os.system("./send-message.sh 'connection regained'")
+                self.send_message("connection regained")
             self.get_number_zones()
             self.get_date_time()
             self.get_system_power()
@@ -831,156 +992,133 @@ class TexecomConnect(object):
             self.get_site_data()
             self.log("Got all areas/zones/users; waiting for events")
             while self.s is not None:
-                try:
-                    for zone in self.zone.values():
-                        zone.update()
-                    if self.siteDataChanged:
-                        self.siteDataChanged = False
-                        self.get_site_data()
-                    self.recvresponse()
-
-                except socket.timeout:
-                    # we didn't send any command, so a timeout is the expected result, continue our loop
+                for zone in self.zone.values():
+                    zone.update()
+                if self.siteDataChanged:
+                    self.siteDataChanged = False
+                    self.get_site_data()
+                # handle any messages that arrived along with the last read or command response
+                self.recvresponse(block=False)
+                if self.s is None:
+                    break
+                # sleep until the panel sends something or it's time for the next idle command
+                timeout = self.IDLE_COMMAND_INTERVAL - (time.time() - self.last_command_time)
+                if any(zone.active or zone.smoothed_active for zone in self.zone.values()):
+                    # keep calling zone.update() so active handlers run and smoothed_active expires
+                    timeout = min(timeout, self.CMD_TIMEOUT)
+                if not self.selector.select(max(timeout, 0)):
+                    if time.time() - self.last_command_time >= self.IDLE_COMMAND_INTERVAL:
+                        self.send_idle_command()
                     continue
+                if self._fill() == 0:
+                    self.log("Panel has closed connection")
+                    self.closesocket()
 
     def decode_message_to_text(self, payload):
         msg_type, payload = payload[0], payload[1:]
-        if msg_type == self.MSG_DEBUG:
-            return "Debug message: " + self.hexstr(payload)
-        elif msg_type == self.MSG_ZONEEVENT:
-            if len(payload) == 2:
-                zone_number = ord(payload[0])
-                zone_bitmap = ord(payload[1])
-            elif len(payload) == 3:
-                zone_number = ord(payload[0]) + (ord(payload[1]) << 8)
-                zone_bitmap = ord(payload[2])
-            else:
-                return "unknown zone event message payload length"
-            zone_state = zone_bitmap & 0x3
-            zone_str = ["secure", "active", "tamper", "short"][zone_state]
-            if zone_bitmap & (1 << 2):
-                zone_str += ", fault"
-            if zone_bitmap & (1 << 3):
-                zone_str += ", failed test"
-            if zone_bitmap & (1 << 4):
-                zone_str += ", alarmed"
-            if zone_bitmap & (1 << 5):
-                zone_str += ", manual bypassed"
-            if zone_bitmap & (1 << 6):
-                zone_str += ", auto bypassed"
-            if zone_bitmap & (1 << 7):
-                zone_str += ", zone masked"
-            if zone_number in self.zone:
-                zone_text = self.zone[zone_number].text
-            else:
-                zone_text = "unknown zone"
-            return "Zone event message: zone {:d} '{}' {}". \
-                format(zone_number, zone_text, zone_str)
-        elif msg_type == self.MSG_AREAEVENT:
-            area_number = ord(payload[0])
-            area_state = ord(payload[1])
-            area_state_str = ["disarmed", "in exit", "in entry", "armed", "part armed", "in alarm"][area_state]
-            if area_number in self.area:
-                areaname = self.area[area_number].name
-            else:
-                areaname = "unknown"
-            return "Area event message: area {:d} {} {}".format(area_number, areaname, area_state_str)
-        elif msg_type == self.MSG_OUTPUTEVENT:
-            locations = ["Panel outputs",
-                         "Digi outputs",
-                         "Digi Channel low 8",
-                         "Digi Channel high 8",
-                         "Redcare outputs",
-                         "Custom outputs 1",
-                         "Custom outputs 2",
-                         "Custom outputs 3",
-                         "Custom outputs 4",
-                         "X-10 outputs"]
-            output_location = ord(payload[0])
-            output_state = ord(payload[1])
-            if output_location < len(locations):
-                output_name = locations[output_location]
-            elif (output_location & 0xf) == 0:
-                output_name = "Network {:d} keypad outputs". \
-                    format(output_location >> 4, output_location & 0xf)
-            else:
-                output_name = "Network {:d} expander {:d} outputs". \
-                    format(output_location >> 4, output_location & 0xf)
-            return "Output event message: location {:d}['{}'] now 0x{:02x}". \
-                format(output_location, output_name, output_state)
-        elif msg_type == self.MSG_USEREVENT:
-            user_number = ord(payload[0])
-            user_state = ord(payload[1])
-            user_state_str = ["code", "tag", "code+tag"][user_state]
-            if user_number in self.user:
-                name = self.user[user_number].name
-            else:
-                name = "unknown"
-            return "User event message: logon by user '{}' {:d} {}". \
-                format(name, user_number, user_state_str)
-        elif msg_type == self.MSG_LOGEVENT:
-            if len(payload) == 8:
-                parameter = ord(payload[2])
-                areas = ord(payload[3])
-                timestamp = payload[4:8]
-            elif len(payload) == 9:
-                # Premier 168 - longer message as 16 bits of area info
-                parameter = ord(payload[2])
-                areas = ord(payload[3]) + (ord(payload[8]) << 8)
-                timestamp = payload[4:8]
-            elif len(payload) == 10:
-                # Premier 640
-                # I'm unsure if this is correct and I don't have a panel to test with
-                parameter = ord(payload[2]) + (ord(payload[3]) << 8)
-                areas = ord(payload[4]) + (ord(payload[5]) << 8)
-                timestamp = payload[6:10]
-            else:
-                return "unknown log event message payload length"
-
-            event_type = ord(payload[0])
-            group_type_msg = ord(payload[1])
-            timestamp_int = ord(timestamp[0]) + (ord(timestamp[1]) << 8) + (ord(timestamp[2]) << 16) + (
-                        ord(timestamp[3]) << 24)
-            seconds = timestamp_int & 63
-            minutes = (timestamp_int >> 6) & 63
-            month = (timestamp_int >> 12) & 15
-            hours = (timestamp_int >> 16) & 31
-            day = (timestamp_int >> 21) & 31
-            year = 2000 + ((timestamp_int >> 26) & 63)
-            timestamp_str = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(year, month, day, hours, minutes,
-                                                                               seconds)
-
-            if event_type in self.log_event_types:
-                event_str = self.log_event_types[event_type]
-            else:
-                event_str = "Unknown log event type {:d}".format(event_type)
+        decoder = self.message_decoders.get(msg_type)
+        if decoder is None:
+            return "unknown message type " + str(msg_type) + ": " + self.hexstr(payload)
+        return decoder(payload)
+
+    def decode_debug_message(self, payload):
+        return "Debug message: " + self.hexstr(payload)
+
+    def decode_zone_event(self, payload):
+        if len(payload) == 2:
+            zone_number, zone_bitmap = payload
+        elif len(payload) == 3:
+            zone_number, zone_bitmap = struct.unpack('<HB', payload)
+        else:
+            return "unknown zone event message payload length"
+        zone_str = self.ZONE_BITMAP_TEXT[zone_bitmap]
+        zone = self.zone.get(zone_number)
+        zone_text = zone.text if zone is not None else "unknown zone"
+        return "Zone event message: zone {:d} '{}' {}". \
+            format(zone_number, zone_text, zone_str)
+
+    def decode_area_event(self, payload):
+        area_number, area_state = payload[0], payload[1]
+        area_state_str = self.AREA_STATES[area_state]
+        area = self.area.get(area_number)
+        areaname = area.name if area is not None else "unknown"
+        return "Area event message: area {:d} {} {}".format(area_number, areaname, area_state_str)
+
+    def decode_output_event(self, payload):
+        output_location, output_state = payload[0], payload[1]
+        if output_location < len(self.OUTPUT_LOCATIONS):
+            output_name = self.OUTPUT_LOCATIONS[output_location]
+        elif (output_location & 0xf) == 0:
+            output_name = "Network {:d} keypad outputs". \
+                format(output_location >> 4, output_location & 0xf)
+        else:
+            output_name = "Network {:d} expander {:d} outputs". \
+                format(output_location >> 4, output_location & 0xf)
+        return "Output event message: location {:d}['{}'] now 0x{:02x}". \
+            format(output_location, output_name, output_state)
+
+    def decode_user_event(self, payload):
+        user_number, user_state = payload[0], payload[1]
+        user_state_str = self.USER_STATES[user_state]
+        user = self.user.get(user_number)
+        name = user.name if user is not None else "unknown"
+        return "User event message: logon by user '{}' {:d} {}". \
+            format(name, user_number, user_state_str)
+
+    def decode_log_event(self, payload):
+        if len(payload) == 8:
+            parameter, areas, timestamp_int = struct.unpack_from('<BBI', payload, 2)
+        elif len(payload) == 9:
+            # Premier 168 - longer message as 16 bits of area info
+            parameter, areas, timestamp_int = struct.unpack_from('<BBI', payload, 2)
+            areas += payload[8] << 8
+        elif len(payload) == 10:
+            # Premier 640
+            # I'm unsure if this is correct and I don't have a panel to test with
+            parameter, areas, timestamp_int = struct.unpack_from('<HHI', payload, 2)
+        else:
+            return "unknown log event message payload length"
+
+        event_type = payload[0]
+        group_type_msg = payload[1]
+        seconds = timestamp_int & 63
+        minutes = (timestamp_int >> 6) & 63
+        month = (timestamp_int >> 12) & 15
+        hours = (timestamp_int >> 16) & 31
+        day = (timestamp_int >> 21) & 31
+        year = 2000 + ((timestamp_int >> 26) & 63)
+        timestamp_str = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(year, month, day, hours, minutes,
+                                                                           seconds)
+
+        if event_type in self.log_event_types:
+            event_str = self.log_event_types[event_type]
+        else:
+            event_str = "Unknown log event type {:d}".format(event_type)
 
-            group_type = group_type_msg & 0b00111111
-            comm_delayed = group_type_msg & 0b01000000
-            communicated = group_type_msg & 0b10000000
+        group_type = group_type_msg & 0b00111111
+        comm_delayed = group_type_msg & 0b01000000
+        communicated = group_type_msg & 0b10000000
 
-            if group_type in self.log_event_group_type:
-                group_type_str = self.log_event_group_type[group_type]
-            else:
-                group_type_str = "Unknown log event group type {:d}".format(group_type)
+        if group_type in self.log_event_group_type:
+            group_type_str = self.log_event_group_type[group_type]
+        else:
+            group_type_str = "Unknown log event group type {:d}".format(group_type)
 
-            if comm_delayed:
-                group_type_str += " [comm delayed]"
-            if communicated:
-                group_type_str += " [communicated]"
+        if comm_delayed:
+            group_type_str += " [comm delayed]"
+        if communicated:
+            group_type_str += " [communicated]"
 
-            return "Log event message: {} {}, {}  parameter: {:d}   areas: {:d}".format(timestamp_str, event_str,
-                                                                                        group_type_str, parameter,
-                                                                                        areas)
-        else:
-            return "unknown message type " + str(ord(msg_type)) + ": " + self.hexstr(payload)
+        return "Log event message: {} {}, {}  parameter: {:d}   areas: {:d}".format(timestamp_str, event_str,
+                                                                                    group_type_str, parameter,
+                                                                                    areas)
 
 def message_handler(payload):
     tc.log(tc.decode_message_to_text(payload))
     msg_type, payload = payload[0], payload[1:]
     if msg_type == tc.MSG_ZONEEVENT:
-        zone_number = ord(payload[0])
-        zone_bitmap = ord(payload[1])
+        zone_number = payload[0]
+        zone_bitmap = payload[1]
         zone = tc.get_zone(zone_number)
         zone.state = zone_bitmap & 0x3
         if zone.state == 1:
@@ -988,24 +1126,6 @@ def message_handler(payload):
         else:
             zone.active = False
 
-# disable buffering to stdout when it's redirected to a file/pipe
-# This makes sure any events appear immediately in the file/pipe,
-# instead of being queued until there is a full buffer's worth.
-class Unbuffered(object):
-    def __init__(self, stream):
-        self.stream = stream
-
-    def write(self, data):
-        self.stream.write(data)
-        self.stream.flush()
-
-    def writelines(self, datas):
-        self.stream.writelines(datas)
-        self.stream.flush()
-
-    def __getattr__(self, attr):
-        return getattr(self.stream, attr)
-
 if __name__ == '__main__':
     texhost = os.getenv('TEXHOST','192.168.1.9')
     texport = os.getenv('TEXPORT',10001)
@@ -1014,6 +1134,9 @@ if __name__ == '__main__':
     # random 16 character alphanumeric string.
     udlpassword = os.getenv('UDLPASSWORD','1234')
 
-    sys.stdout = Unbuffered(sys.stdout)
+    # flush stdout at the end of every line even when it's redirected to a
+    # file/pipe. This makes sure any events appear immediately in the
+    # file/pipe, instead of being queued until there is a full buffer's worth.
+    sys.stdout.reconfigure(line_buffering=True)
     tc = TexecomConnect(texhost, texport, udlpassword, message_handler)
     tc.event_loop()